@@ -0,0 +1,135 @@
+import asyncio
+import json
+import time
+import random
+import argparse
+from urllib.parse import urlparse
+
+import numpy as np
+
+from prediction_service import build_server
+
+# Pontos "quentes" repetidos para exercitar o cache (cidades / zonas sísmicas)
+HOTSPOTS = [
+    (-23.55, -46.63),   # São Paulo
+    (35.68, 139.69),    # Tóquio
+    (-33.45, -70.66),   # Santiago
+    (37.77, -122.42),   # São Francisco
+    (19.43, -99.13),    # Cidade do México
+]
+
+
+def random_instance(rng, hot_fraction):
+    if rng.random() < hot_fraction:
+        lat, lon = rng.choice(HOTSPOTS)
+    else:
+        lat, lon = rng.uniform(-90, 90), rng.uniform(-180, 180)
+    return {'latitude': lat, 'longitude': lon, 'depth': rng.choice([5.0, 10.0, 35.0, 70.0])}
+
+
+async def client(host, port, n_requests, rng, hot_fraction, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(n_requests):
+            body = json.dumps(random_instance(rng, hot_fraction)).encode()
+            request = (f"POST /predict HTTP/1.1\r\nHost: {host}\r\n"
+                       f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body
+            t0 = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+
+            status_line = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                if name.strip().lower() == 'content-length':
+                    length = int(value.strip())
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - t0)
+            if b' 200 ' not in status_line:
+                errors.append(status_line.decode('latin-1').strip())
+    finally:
+        writer.close()
+
+
+async def fetch_metrics(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET /metrics HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    return json.loads(raw.split(b'\r\n\r\n', 1)[1])
+
+
+async def run(args):
+    server = None
+    if args.url:
+        parsed = urlparse(args.url)
+        host, port = parsed.hostname, parsed.port or 80
+    else:
+        # Sobe o serviço no mesmo processo, em porta livre – tudo local
+        server = build_server(args.model, '127.0.0.1', 0, args.max_batch,
+                              args.max_wait_ms, args.cache_size)
+        await server.start()
+        host, port = server.host, server.port
+        print(f"Servidor local iniciado em http://{host}:{port}")
+
+    try:
+        # Distribui o resto da divisão entre os primeiros clientes
+        base, extra = divmod(args.requests, args.concurrency)
+        counts = [base + (1 if i < extra else 0) for i in range(args.concurrency)]
+        counts = [n for n in counts if n > 0]
+        latencies, errors = [], []
+        print(f"Disparando {args.requests:,} requisições "
+              f"com {len(counts)} clientes concorrentes...")
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*[
+            client(host, port, n, random.Random(args.seed + i), args.hot_fraction, latencies, errors)
+            for i, n in enumerate(counts)
+        ])
+        elapsed = time.perf_counter() - t0
+
+        print(f"\nConcluído em {elapsed:.2f} s")
+        if latencies:
+            lat_ms = np.array(latencies) * 1000
+            print(f"Throughput: {len(latencies) / elapsed:,.0f} req/s")
+            print(f"Latência (ms): p50={np.percentile(lat_ms, 50):.2f} "
+                  f"p95={np.percentile(lat_ms, 95):.2f} p99={np.percentile(lat_ms, 99):.2f} "
+                  f"max={lat_ms.max():.2f}")
+        else:
+            print("Nenhuma requisição concluída.")
+        print(f"Erros: {len(errors)}")
+
+        metrics = await fetch_metrics(host, port)
+        print("\nMétricas do servidor:")
+        print(json.dumps(metrics, indent=2, ensure_ascii=False))
+    finally:
+        if server:
+            await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga local do serviço de predição")
+    parser.add_argument('--url', help="alvo já em execução (ex.: http://127.0.0.1:8000); "
+                                      "se omitido, sobe o servidor no próprio processo")
+    parser.add_argument('--requests', type=int, default=20_000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--hot-fraction', type=float, default=0.3,
+                        help="fração de requisições em pontos repetidos (acerto de cache)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--model', default='model_magnitude_predictor.pkl')
+    parser.add_argument('--max-batch', type=int, default=256)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    parser.add_argument('--cache-size', type=int, default=100_000)
+    args = parser.parse_args()
+    if args.requests < 1 or args.concurrency < 1:
+        parser.error("--requests e --concurrency devem ser >= 1")
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
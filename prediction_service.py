@@ -0,0 +1,445 @@
+import asyncio
+import json
+import math
+import time
+import argparse
+from collections import OrderedDict, deque
+
+import numpy as np
+import pandas as pd
+import joblib
+
+# Mesmo schema de features usado no treino (ver features_mag em machine_learning.py)
+FEATURES_MAG = ['latitude', 'longitude', 'depth', 'year', 'month', 'day', 'hour']
+
+# Valores padrão de data/hora – os mesmos usados pelo streamlit_app.py
+DEFAULT_DEPTH = 10.0
+DEFAULT_TIME = {'year': 2025, 'month': 12, 'day': 29, 'hour': 12}
+TIME_RANGES = {'year': (1900, 2100), 'month': (1, 12), 'day': (1, 31), 'hour': (0, 23)}
+
+# Quantização da chave de cache (graus / km)
+LATLON_STEP = 0.01
+DEPTH_STEP = 1.0
+
+
+class ServiceUnavailable(Exception):
+    pass
+
+
+def quantize(value, step):
+    return round(round(value / step) * step, 6)
+
+
+def make_key(row):
+    return (
+        quantize(row['latitude'], LATLON_STEP),
+        quantize(row['longitude'], LATLON_STEP),
+        quantize(row['depth'], DEPTH_STEP),
+        row['year'], row['month'], row['day'], row['hour'],
+    )
+
+
+def parse_instance(obj):
+    try:
+        lat = float(obj['latitude'])
+        lon = float(obj['longitude'])
+        depth = float(obj.get('depth', DEFAULT_DEPTH))
+        row = {'latitude': lat, 'longitude': lon, 'depth': depth}
+        for col, default in DEFAULT_TIME.items():
+            row[col] = int(obj.get(col, default))
+    except (KeyError, TypeError, ValueError, OverflowError) as e:
+        raise ValueError(f"instância inválida: {e}") from None
+    if not all(math.isfinite(v) for v in (lat, lon, depth)):
+        raise ValueError("latitude/longitude/depth devem ser números finitos")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or depth < 0:
+        raise ValueError("latitude/longitude/depth fora do intervalo válido")
+    for col, (low, high) in TIME_RANGES.items():
+        if not low <= row[col] <= high:
+            raise ValueError(f"{col} fora do intervalo válido ({low}–{high})")
+    return row
+
+
+# ==================== CACHE LRU ====================
+class LRUCache:
+    def __init__(self, maxsize=100_000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key):
+        value = self._data.get(key)
+        if value is not None:
+            self._data.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+# ==================== MÉTRICAS ====================
+# Janela (s) usada para o throughput "atual" em /metrics
+THROUGHPUT_WINDOW_S = 10
+
+
+class Metrics:
+    def __init__(self, window=10_000):
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.instances = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.batches = 0
+        self.batched_rows = 0
+        self.latencies = deque(maxlen=window)
+        self.batch_latencies = deque(maxlen=window)
+        # Contadores por segundo: [segundo, requisições concluídas]
+        self._completed = deque()
+
+    def record_latency(self, seconds):
+        self.latencies.append(seconds)
+        now = int(time.perf_counter())
+        if self._completed and self._completed[-1][0] == now:
+            self._completed[-1][1] += 1
+        else:
+            self._completed.append([now, 1])
+        while self._completed[0][0] <= now - THROUGHPUT_WINDOW_S:
+            self._completed.popleft()
+
+    def recent_throughput(self):
+        now = time.perf_counter()
+        start = int(now) - THROUGHPUT_WINDOW_S
+        count = sum(n for sec, n in self._completed if sec > start)
+        # No início do processo a janela ainda não está completa
+        span = min(THROUGHPUT_WINDOW_S, now - self.started)
+        return count / span if span > 0 else 0.0
+
+    def snapshot(self, cache_size):
+        uptime = time.perf_counter() - self.started
+        lat = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        blat = np.array(self.batch_latencies) * 1000 if self.batch_latencies else np.zeros(1)
+        return {
+            'uptime_s': round(uptime, 3),
+            'requests': self.requests,
+            'instances': self.instances,
+            'errors': self.errors,
+            'throughput_rps': round(self.recent_throughput(), 2),
+            'throughput_window_s': THROUGHPUT_WINDOW_S,
+            'throughput_rps_lifetime': round(self.requests / uptime, 2) if uptime else 0.0,
+            'cache_hits': self.cache_hits,
+            'cache_hit_rate': round(self.cache_hits / self.instances, 4) if self.instances else 0.0,
+            'cache_size': cache_size,
+            'batches': self.batches,
+            'avg_batch_size': round(self.batched_rows / self.batches, 2) if self.batches else 0.0,
+            'latency_ms': {
+                'p50': round(float(np.percentile(lat, 50)), 3),
+                'p95': round(float(np.percentile(lat, 95)), 3),
+                'p99': round(float(np.percentile(lat, 99)), 3),
+                'max': round(float(lat.max()), 3),
+            },
+            'batch_predict_ms': {
+                'p50': round(float(np.percentile(blat, 50)), 3),
+                'p99': round(float(np.percentile(blat, 99)), 3),
+            },
+        }
+
+
+# ==================== MICRO-BATCHING ====================
+class MagnitudePredictor:
+    """Agrupa requisições concorrentes em lotes vetorizados para o modelo.
+
+    Cada lote é fechado quando atinge ``max_batch`` linhas ou quando
+    ``max_wait_ms`` se passam desde a primeira requisição pendente.
+    """
+
+    def __init__(self, model, max_batch=256, max_wait_ms=5.0, cache_size=100_000):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.cache = LRUCache(cache_size)
+        self.metrics = Metrics()
+        self._queue = None
+        self._task = None
+        self._inflight = []
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._batch_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Nenhum handler pode ficar esperando para sempre por um lote que não virá
+        pending = self._inflight
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for _, fut in pending:
+            if not fut.done():
+                fut.set_exception(ServiceUnavailable('serviço encerrando'))
+        self._inflight = []
+
+    async def predict(self, rows):
+        if self._task is None:
+            raise ServiceUnavailable('serviço não iniciado')
+        loop = asyncio.get_running_loop()
+        self.metrics.instances += len(rows)
+        results = [None] * len(rows)
+        pending = []
+        for i, row in enumerate(rows):
+            key = make_key(row)
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.metrics.cache_hits += 1
+                results[i] = cached
+            else:
+                fut = loop.create_future()
+                self._queue.put_nowait((key, fut))
+                pending.append((i, fut))
+        if pending:
+            values = await asyncio.gather(*(fut for _, fut in pending))
+            for (i, _), value in zip(pending, values):
+                results[i] = value
+        return results
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            self._inflight = items
+            deadline = loop.time() + self.max_wait
+            while len(items) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Drena o que já chegou sem esperar mais
+            while len(items) < self.max_batch and not self._queue.empty():
+                items.append(self._queue.get_nowait())
+            await self._run_batch(items)
+            self._inflight = []
+
+    async def _run_batch(self, items):
+        # Chaves repetidas dentro do lote são previstas uma única vez
+        unique = {}
+        for key, fut in items:
+            unique.setdefault(key, []).append(fut)
+        keys = list(unique)
+        X = pd.DataFrame(keys, columns=FEATURES_MAG)
+
+        t0 = time.perf_counter()
+        try:
+            # predict roda fora do event loop para não travar o servidor
+            preds = await asyncio.get_running_loop().run_in_executor(None, self.model.predict, X)
+        except Exception as e:
+            for futs in unique.values():
+                for fut in futs:
+                    if not fut.done():
+                        fut.set_exception(e)
+            return
+        self.metrics.batch_latencies.append(time.perf_counter() - t0)
+        self.metrics.batches += 1
+        self.metrics.batched_rows += len(keys)
+
+        for key, pred in zip(keys, preds):
+            value = float(pred)
+            self.cache.put(key, value)
+            for fut in unique[key]:
+                if not fut.done():
+                    fut.set_result(value)
+
+
+# ==================== SERVIDOR HTTP (asyncio puro) ====================
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+# Limites de segurança do parser HTTP
+MAX_BODY_BYTES = 1_048_576
+MAX_HEADERS = 100
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class PredictionServer:
+    def __init__(self, predictor, host='127.0.0.1', port=8000):
+        self.predictor = predictor
+        self.host = host
+        self.port = port
+        self._server = None
+        self._handlers = set()
+
+    async def start(self):
+        await self.predictor.start()
+        self._server = await asyncio.start_server(self._handle_conn, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            # Conexões keep-alive ociosas seguram wait_closed() para sempre (Python >= 3.12.1)
+            handlers = list(self._handlers)
+            for task in handlers:
+                task.cancel()
+            await asyncio.gather(*handlers, return_exceptions=True)
+            await self._server.wait_closed()
+        await self.predictor.stop()
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"Servidor de predição em http://{self.host}:{self.port} "
+              f"(lote máx. {self.predictor.max_batch}, janela {self.predictor.max_wait * 1000:.1f} ms)")
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def _handle_conn(self, reader, writer):
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except RequestError as e:
+                    await self._send(writer, e.status, {'error': str(e)}, False)
+                    break
+                if request is None:
+                    break
+                method, path, version, headers, body = request
+                keep_alive = (headers.get('connection', '').lower() != 'close'
+                              and version == 'HTTP/1.1')
+
+                status, payload = await self._dispatch(method, path, body)
+                await self._send(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._handlers.discard(task)
+            writer.close()
+
+    async def _read_request(self, reader):
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return None
+            try:
+                method, path, version = request_line.decode('latin-1').split()
+            except ValueError:
+                raise RequestError(400, 'linha de requisição inválida') from None
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                if len(headers) >= MAX_HEADERS:
+                    raise RequestError(400, 'cabeçalhos demais')
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+        except (ValueError, asyncio.LimitOverrunError):
+            # readline levanta ValueError quando a linha excede o limite do StreamReader
+            raise RequestError(400, 'linha de cabeçalho longa demais') from None
+
+        raw_length = headers.get('content-length', '0') or '0'
+        if not (raw_length.isascii() and raw_length.isdigit()):
+            raise RequestError(400, 'Content-Length inválido')
+        length = int(raw_length)
+        if length > MAX_BODY_BYTES:
+            raise RequestError(413, f'corpo maior que {MAX_BODY_BYTES} bytes')
+        body = await reader.readexactly(length) if length else b''
+        return method, path, version, headers, body
+
+    async def _dispatch(self, method, path, body):
+        if path == '/health':
+            return 200, {'status': 'ok'}
+        if path == '/metrics':
+            return 200, self.predictor.metrics.snapshot(len(self.predictor.cache))
+        if path != '/predict':
+            return 404, {'error': 'rota não encontrada'}
+        if method != 'POST':
+            return 405, {'error': 'use POST'}
+
+        t0 = time.perf_counter()
+        metrics = self.predictor.metrics
+        metrics.requests += 1
+        try:
+            data = json.loads(body or b'{}')
+            # Aceita uma instância única ou {"instances": [...]}
+            batch = isinstance(data, dict) and 'instances' in data
+            raw = data['instances'] if batch else [data]
+            if not isinstance(raw, list) or not raw:
+                raise ValueError("'instances' deve ser uma lista não vazia")
+            rows = [parse_instance(obj) for obj in raw]
+        except (ValueError, TypeError) as e:
+            metrics.errors += 1
+            return 400, {'error': str(e)}
+
+        try:
+            preds = await self.predictor.predict(rows)
+        except ServiceUnavailable as e:
+            metrics.errors += 1
+            return 503, {'error': str(e)}
+        except Exception as e:
+            metrics.errors += 1
+            return 500, {'error': f'falha na predição: {e}'}
+
+        metrics.record_latency(time.perf_counter() - t0)
+        if batch:
+            return 200, {'predictions': [round(p, 4) for p in preds]}
+        return 200, {'magnitude': round(preds[0], 4)}
+
+    async def _send(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode()
+        head = (f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+
+def build_server(model_path='model_magnitude_predictor.pkl', host='127.0.0.1', port=8000,
+                 max_batch=256, max_wait_ms=5.0, cache_size=100_000):
+    model = joblib.load(model_path)
+    predictor = MagnitudePredictor(model, max_batch=max_batch, max_wait_ms=max_wait_ms,
+                                   cache_size=cache_size)
+    return PredictionServer(predictor, host=host, port=port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serviço HTTP de predição de magnitude com micro-batching")
+    parser.add_argument('--model', default='model_magnitude_predictor.pkl')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch', type=int, default=256, help="linhas máximas por lote")
+    parser.add_argument('--max-wait-ms', type=float, default=5.0, help="janela de coalescência (ms)")
+    parser.add_argument('--cache-size', type=int, default=100_000, help="entradas no cache LRU (0 desativa)")
+    args = parser.parse_args()
+
+    server = build_server(args.model, args.host, args.port, args.max_batch,
+                          args.max_wait_ms, args.cache_size)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("\nServidor encerrado.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,291 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from prediction_service import (
+    FEATURES_MAG, LRUCache, MagnitudePredictor, Metrics, PredictionServer, ServiceUnavailable,
+    make_key, parse_instance,
+)
+
+
+class RecordingModel:
+    """Modelo falso: registra o tamanho de cada lote e devolve latitude + depth."""
+
+    def __init__(self, delay=0.0, fail=False):
+        self.batches = []
+        self.delay = delay
+        self.fail = fail
+
+    def predict(self, X):
+        assert list(X.columns) == FEATURES_MAG
+        self.batches.append(len(X))
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError('modelo quebrado')
+        return (X['latitude'] + X['depth']).to_numpy()
+
+
+def point(lat, lon=0.0, depth=10.0):
+    return parse_instance({'latitude': lat, 'longitude': lon, 'depth': depth})
+
+
+async def with_predictor(model, coro, **kwargs):
+    predictor = MagnitudePredictor(model, **kwargs)
+    await predictor.start()
+    try:
+        return await coro(predictor)
+    finally:
+        await predictor.stop()
+
+
+# ==================== CACHE / CHAVES ====================
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1.0)
+    cache.put('b', 2.0)
+    assert cache.get('a') == 1.0  # 'a' passa a ser o mais recente
+    cache.put('c', 3.0)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1.0
+    assert cache.get('c') == 3.0
+    assert len(cache) == 2
+
+
+def test_lru_disabled_with_zero_size():
+    cache = LRUCache(maxsize=0)
+    cache.put('a', 1.0)
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_make_key_quantizes_nearby_points():
+    assert make_key(point(-23.551, -46.631, 10.2)) == make_key(point(-23.549, -46.629, 9.8))
+    assert make_key(point(-23.55)) != make_key(point(-23.56))
+
+
+# ==================== VALIDAÇÃO ====================
+@pytest.mark.parametrize('obj', [
+    {'longitude': 0},
+    {'latitude': 'abc', 'longitude': 0},
+    {'latitude': 91, 'longitude': 0},
+    {'latitude': 0, 'longitude': 0, 'depth': -1},
+    {'latitude': 0, 'longitude': 0, 'depth': float('inf')},
+    {'latitude': float('nan'), 'longitude': 0},
+    {'latitude': 0, 'longitude': 0, 'year': float('inf')},
+    {'latitude': 0, 'longitude': 0, 'year': 1e30},
+    {'latitude': 0, 'longitude': 0, 'month': 13},
+    {'latitude': 0, 'longitude': 0, 'day': 0},
+    {'latitude': 0, 'longitude': 0, 'hour': 99},
+])
+def test_parse_instance_rejects_invalid(obj):
+    with pytest.raises(ValueError):
+        parse_instance(obj)
+
+
+def test_parse_instance_fills_defaults():
+    row = parse_instance({'latitude': 1, 'longitude': 2})
+    assert row == {'latitude': 1.0, 'longitude': 2.0, 'depth': 10.0,
+                   'year': 2025, 'month': 12, 'day': 29, 'hour': 12}
+
+
+def test_throughput_reflects_recent_window(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(time, 'perf_counter', lambda: clock[0])
+    metrics = Metrics()
+    for _ in range(50):
+        clock[0] += 0.1
+        metrics.requests += 1
+        metrics.record_latency(0.001)
+    assert metrics.snapshot(0)['throughput_rps'] == pytest.approx(10.0, rel=0.15)
+
+    clock[0] += 600  # serviço ocioso
+    snap = metrics.snapshot(0)
+    assert snap['throughput_rps'] == 0.0
+    assert snap['throughput_rps_lifetime'] == pytest.approx(50 / 605, abs=0.01)
+
+
+# ==================== MICRO-BATCHING ====================
+def test_concurrent_requests_respect_max_batch():
+    model = RecordingModel()
+
+    async def scenario(predictor):
+        return await asyncio.gather(*[predictor.predict([point(i)]) for i in range(10)])
+
+    results = asyncio.run(with_predictor(model, scenario, max_batch=4, max_wait_ms=50))
+    assert model.batches == [4, 4, 2]
+    assert [r[0] for r in results] == [i + 10.0 for i in range(10)]
+
+
+def test_requests_apart_beyond_window_are_not_coalesced():
+    model = RecordingModel()
+
+    async def scenario(predictor):
+        await predictor.predict([point(1)])
+        await asyncio.sleep(0.05)
+        await predictor.predict([point(2)])
+
+    asyncio.run(with_predictor(model, scenario, max_batch=100, max_wait_ms=5))
+    assert model.batches == [1, 1]
+
+
+def test_requests_within_window_are_coalesced():
+    model = RecordingModel()
+
+    async def scenario(predictor):
+        first = asyncio.create_task(predictor.predict([point(1)]))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(predictor.predict([point(2)]))
+        return await asyncio.gather(first, second)
+
+    asyncio.run(with_predictor(model, scenario, max_batch=100, max_wait_ms=200))
+    assert model.batches == [2]
+
+
+def test_duplicate_keys_in_batch_predicted_once():
+    model = RecordingModel()
+
+    async def scenario(predictor):
+        return await asyncio.gather(*[predictor.predict([point(5)]) for _ in range(6)])
+
+    results = asyncio.run(with_predictor(model, scenario, max_batch=100, max_wait_ms=20,
+                                         cache_size=0))
+    assert model.batches == [1]
+    assert all(r == [15.0] for r in results)
+
+
+def test_cache_hit_skips_model():
+    model = RecordingModel()
+
+    async def scenario(predictor):
+        await predictor.predict([point(3)])
+        return await predictor.predict([point(3.001), point(4)])
+
+    results = asyncio.run(with_predictor(model, scenario, max_wait_ms=1))
+    assert model.batches == [1, 1]
+    assert results == [13.0, 14.0]
+
+
+def test_model_failure_propagates_to_every_waiter():
+    model = RecordingModel(fail=True)
+
+    async def scenario(predictor):
+        return await asyncio.gather(
+            *[predictor.predict([point(i), point(i + 50)]) for i in range(3)],
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(with_predictor(model, scenario, max_wait_ms=10))
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_stop_fails_pending_requests():
+    model = RecordingModel(delay=0.2)
+
+    async def scenario():
+        predictor = MagnitudePredictor(model, max_batch=2, max_wait_ms=1)
+        await predictor.start()
+        tasks = [asyncio.create_task(predictor.predict([point(i)])) for i in range(5)]
+        await asyncio.sleep(0.05)
+        await predictor.stop()
+        return await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), 1)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(r, ServiceUnavailable) for r in results)
+
+
+# ==================== HTTP ====================
+async def raw_request(port, data):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(data)
+    await writer.drain()
+    raw = await asyncio.wait_for(reader.read(), 2)
+    writer.close()
+    head, _, body = raw.partition(b'\r\n\r\n')
+    status = int(head.split()[1]) if head else None
+    return status, (json.loads(body) if body else None)
+
+
+def post(body, extra_headers=b''):
+    if isinstance(body, str):
+        body = body.encode()
+    return (b'POST /predict HTTP/1.1\r\nConnection: close\r\n' + extra_headers
+            + b'Content-Length: %d\r\n\r\n' % len(body) + body)
+
+
+def run_http(*requests):
+    async def scenario():
+        server = PredictionServer(MagnitudePredictor(RecordingModel(), max_wait_ms=1), port=0)
+        await server.start()
+        try:
+            return [await raw_request(server.port, r) for r in requests]
+        finally:
+            await server.stop()
+    return asyncio.run(scenario())
+
+
+def test_http_predict_single_and_batch():
+    single, batch = run_http(
+        post('{"latitude": 1, "longitude": 2}'),
+        post('{"instances": [{"latitude": 1, "longitude": 2}, {"latitude": 3, "longitude": 4, "depth": 0}]}'),
+    )
+    assert single == (200, {'magnitude': 11.0})
+    assert batch == (200, {'predictions': [11.0, 3.0]})
+
+
+@pytest.mark.parametrize('body', [
+    '{"latitude": 1, "longitude": 2, "year": 1e999}',
+    '{"latitude": 1, "longitude": 2, "depth": Infinity}',
+    '{"latitude": 1, "longitude": 2, "month": 13}',
+    '{"instances": []}',
+    'not json',
+])
+def test_http_invalid_instance_returns_400(body):
+    [(status, payload)] = run_http(post(body))
+    assert status == 400
+    assert 'error' in payload
+
+
+@pytest.mark.parametrize('length, expected', [
+    (b'abc', 400),
+    (b'-5', 400),
+    (b'999999999', 413),
+])
+def test_http_bad_content_length(length, expected):
+    request = b'POST /predict HTTP/1.1\r\nContent-Length: ' + length + b'\r\n\r\n'
+    [(status, _)] = run_http(request)
+    assert status == expected
+
+
+def test_http_oversized_header_line_returns_400():
+    [(status, _)] = run_http(b'GET /health HTTP/1.1\r\nX-Big: ' + b'a' * 70_000 + b'\r\n\r\n')
+    assert status == 400
+
+
+def test_http_routes():
+    health, missing, wrong_method = run_http(
+        b'GET /health HTTP/1.1\r\nConnection: close\r\n\r\n',
+        b'GET /nope HTTP/1.1\r\nConnection: close\r\n\r\n',
+        b'GET /predict HTTP/1.1\r\nConnection: close\r\n\r\n',
+    )
+    assert health == (200, {'status': 'ok'})
+    assert missing[0] == 404
+    assert wrong_method[0] == 405
+
+
+def test_http_stop_with_idle_keep_alive_client():
+    async def scenario():
+        server = PredictionServer(MagnitudePredictor(RecordingModel(), max_wait_ms=1), port=0)
+        await server.start()
+        reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+        writer.write(b'GET /health HTTP/1.1\r\n\r\n')
+        await writer.drain()
+        assert b' 200 ' in await reader.readline()
+        # Cliente continua conectado (keep-alive) enquanto o servidor encerra
+        await asyncio.wait_for(server.stop(), 2)
+        assert await asyncio.wait_for(reader.read(), 2) is not None
+        writer.close()
+
+    asyncio.run(scenario())